@@ -24,7 +24,8 @@ class MainGUI(ttk.Frame):
         self.output_path = 'temp'  # store output path
         self.config = Config(path=self.output_path)  # open config file of the main window
         # Create OpenCV filters object
-        self.filters = Filters(master=self.master, filter_num=self.config.get_current_filter())
+        self.filters = Filters(master=self.master, filter_num=self.config.get_current_filter(),
+                               opencl=self.config.get_use_opencl())
         self.camera = Camera(current=self.config.get_current_camera())  # create web camera object
         #
         self.this_dir = os.path.dirname(os.path.realpath(__file__))  # directory of this file
@@ -270,5 +271,6 @@ class MainGUI(ttk.Frame):
             self.config.set_current_camera(self.camera.current_camera)  # save current web camera
             self.camera.destroy()
         self.config.destroy()
+        self.filters.destroy()
         logging.info('Close GUI')
         self.quit()
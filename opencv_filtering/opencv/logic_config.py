@@ -29,6 +29,10 @@ class Config:
         self.__current_camera = 'CurrentCamera'  # current web camera number
         self.__default_camera = '0'  # default current camera number
         #
+        self.__opencl = 'OpenCL'  # info about OpenCL
+        self.__use_opencl = 'UseOpenCL'  # process heavy filters with OpenCL if it is available
+        self.__default_opencl = 'False'  # do not use OpenCL by default
+        #
         self.__config = configparser.ConfigParser()  # create config parser
         self.__config.optionxform = lambda option: option  # preserve case for letters
         # Create config directory if not exist
@@ -106,6 +110,20 @@ class Config:
             current_camera = self.__default_camera
         self.__config[self.__camera][self.__current_camera] = str(current_camera)
 
+    def get_use_opencl(self):
+        """ Get OpenCL flag if it is available or return default flag """
+        try:
+            return self.__config.getboolean(self.__opencl, self.__use_opencl)
+        except (configparser.Error, ValueError):  # if the option is not in config or it is not boolean
+            return self.__default_opencl == 'True'
+
+    def set_use_opencl(self, use_opencl=None):
+        """ Set OpenCL flag to the config INI file """
+        self.__check_section(self.__opencl)
+        if use_opencl is None:
+            use_opencl = self.__default_opencl
+        self.__config[self.__opencl][self.__use_opencl] = str(use_opencl)
+
     def save(self):
         """ Save config file """
         with open(self.__config_path, 'w') as configfile:
@@ -115,6 +133,7 @@ class Config:
         """ Create new config INI file and put default values in it """
         self.set_win_geometry(self.default_geometry)
         self.set_win_state(self.default_state)
+        self.set_use_opencl(self.__default_opencl)
 
     def destroy(self):
         """ Config destructor """
@@ -4,16 +4,43 @@ import copy
 import random
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+
 from .logic_logger import logging
 
 
+def get_tracks(new, old, width, height):
+    """ Integer coordinates of the optical flow tracks limited by the frame borders.
+        Return line segments from new to old points and zero length segments for circles """
+    lines = np.empty((len(new), 2, 2), np.int32)
+    lines[:, 0] = np.rint(new.reshape(-1, 2))  # drawing functions take integer coordinates only
+    lines[:, 1] = np.rint(old.reshape(-1, 2))
+    np.clip(lines[:, :, 0], 0, width - 1, lines[:, :, 0])  # lost points could fly away from the frame
+    np.clip(lines[:, :, 1], 0, height - 1, lines[:, :, 1])
+    circles = np.empty_like(lines)  # thick segments of zero length are filled circles
+    circles[:, 0] = lines[:, 0]
+    circles[:, 1] = lines[:, 0]
+    return lines, circles
+
+
 class Filters:
     """ OpenCV filters """
-    def __init__(self, master, filter_num=0):
+    # Attributes are kept in slots instead of the dictionary of the object for faster access
+    __slots__ = ('current_filter', 'master', 'opencl', 'frame', '_gray', '_hsv', 'previous',
+                 'background_subtractor', 'opt_flow', 'clahe', 'skin', 'affine_start', 'affine',
+                 'detector', 'xfeatures', 'buffers', 'pool', 'container', 'function')
+
+    def __init__(self, master, filter_num=0, opencl=False):
         """ Initialize filters """
         self.current_filter = filter_num  # current OpenCV filter_num
         self.master = master  # link to the main GUI window
+        # Process heavy filters with OpenCL through Transparent API (UMat) if it is available
+        self.opencl = opencl and cv2.ocl.haveOpenCL()
+        if self.opencl:
+            cv2.ocl.setUseOpenCL(True)
         self.frame = None  # current frame
+        self._gray = None  # gray scale of the current frame, converted on demand
+        self._hsv = None  # HSV of the current frame, converted on demand
         self.previous = None  # previous frame (gray or color)
         self.background_subtractor = None
         self.opt_flow = {  # container for Optical Flow algorithm
@@ -26,13 +53,29 @@ class Filters:
             'lk_params': dict(winSize=(15, 15),
                               maxLevel=2,
                               criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)),
-            # Create some random colors
-            'color': np.random.randint(0, 255, (100, 3)),
+            # Create palette of random colors. Tracks are drawn with one call per color
+            'color': np.random.randint(0, 255, (10, 3), dtype=np.uint8),
             # Container for corner points of the previous frame
             'points': None,
+            # Future of corner points, which are detected in the pool of threads
+            'corners': None,
             # Container for image mask
             'mask': None,
         }
+        # Palette colors as tuples of Python integers for drawing functions
+        self.opt_flow['colors'] = [tuple(color) for color in self.opt_flow['color'].tolist()]
+        self.clahe = {  # container for CLAHE objects
+            # 'clipLimit' parameter is 40 by default; 'tileGridSize' parameter is 8x8 by default
+            'rgb': cv2.createCLAHE(clipLimit=10., tileGridSize=(8, 8)),
+            'lab': cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)),
+        }
+        self.skin = {  # container for skin tones detection
+            # Upper and lower HSV limits for skin tones
+            'lower': np.array([0, 100, 0], dtype='uint8'),
+            'upper': np.array([50, 255, 255], dtype='uint8'),
+            # Kernel for morphology operation
+            'kernel': cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9)),
+        }
         self.affine_start = {  # starting rotation, shift and transformation
             'rotation': 0,
             'shift': [0, 0],
@@ -41,6 +84,10 @@ class Filters:
         }
         self.affine = None  # container for random affine values
         self.detector = None  # blob detector container
+        self.xfeatures = {}  # container for feature detectors and descriptor extractors
+        self.buffers = {}  # container for output arrays reused from frame to frame
+        # Pool of threads for independent passes of the filters. OpenCV releases GIL in its functions
+        self.pool = ThreadPoolExecutor(max_workers=4)
         # List of filters in the following format: [name, function, description]
         # Filter functions take frame, convert it and return converted image
         self.container = [
@@ -71,8 +118,13 @@ class Filters:
             ['Sobel Y', self.filter_sobel_y, 'Sobel / Scharr horizontal gradient filter'],
             ['Blobs', self.filter_blob, 'Blob detection'],
         ]
+        self.function = self.container[self.current_filter][1]  # function of the current filter
         self.master.title(f'OpenCV Filtering - {self.container[self.current_filter][2]}')
 
+    def destroy(self):
+        """ Filters destructor """
+        self.pool.shutdown(wait=False)
+
     def get_filter(self):
         """ Get filter name """
         return self.container[self.current_filter][0]
@@ -81,6 +133,7 @@ class Filters:
         """ Set current filter """
         self.previous = None
         self.current_filter = current
+        self.function = self.container[self.current_filter][1]
         logging.info(f'Set filter to {self.get_filter()}')
         self.master.title('OpenCV Filtering - ' + self.container[self.current_filter][2])
 
@@ -101,7 +154,48 @@ class Filters:
     def convert(self, frame):
         """ Convert frame using current filter function """
         self.frame = frame
-        return self.container[self.current_filter][1]()
+        self._gray = None  # forget color conversions of the previous frame
+        self._hsv = None
+        return self.function()
+
+    @property
+    def gray(self):
+        """ Gray scale of the current frame. Convert it only once per frame """
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
+        return self._gray
+
+    @property
+    def hsv(self):
+        """ HSV of the current frame. Convert it only once per frame """
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(self.frame, cv2.COLOR_RGB2HSV)
+        return self._hsv
+
+    def get_buffer(self, name, shape, dtype=np.uint8, value=None):
+        """ Get output array of the given shape. Allocate it again only if the shape is changed.
+            Newly allocated array is filled with the value if it is given """
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            if value is None:
+                buffer = np.empty(shape, dtype)
+            else:
+                buffer = np.full(shape, value, dtype)
+            self.buffers[name] = buffer
+        return buffer
+
+    def get_output(self, name, shape, dtype=np.uint8):
+        """ Get reused output array for OpenCV functions. With OpenCL they allocate UMat themselves """
+        return None if self.opencl else self.get_buffer(name, shape, dtype)
+
+    def umat(self, image):
+        """ Wrap image into UMat, so OpenCV processes it with OpenCL if it is on """
+        return cv2.UMat(image) if self.opencl else image
+
+    @staticmethod
+    def download(image):
+        """ Get NumPy array back from UMat """
+        return image.get() if isinstance(image, cv2.UMat) else image
 
     def filter_unchanged(self):
         """ Show unchanged frames """
@@ -109,70 +203,131 @@ class Filters:
 
     def filter_canny(self):
         """ Canny edge detection """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        return cv2.Canny(gray, 50, 200)  # Canny edge detection
+        gray = self.umat(self.gray)  # gray scale of the frame
+        edges = self.get_output('canny', self.gray.shape)
+        return self.download(cv2.Canny(gray, 50, 200, edges=edges))  # Canny edge detection
 
     def filter_threshold(self):
         """ Adaptive Gaussian threshold """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+        gray = self.umat(self.gray)  # gray scale of the frame
+        dst = self.get_output('threshold', self.gray.shape)
+        return self.download(cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                   cv2.THRESH_BINARY, 11, 2, dst=dst))
 
     def filter_harris(self):
         """ Harris corner detection """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        gray = np.float32(gray)  # convert to NumPy array
+        small = cv2.pyrDown(self.gray)  # detect corners on the twice smaller gray frame
+        gray = self.get_buffer('harris_gray', small.shape, np.float32)
+        np.copyto(gray, small)  # convert to float32 in the reused array
+        corners = self.get_buffer('harris_corners', small.shape, np.float32)
         # k-size parameter is odd and must be [3, 31]
-        dest = cv2.cornerHarris(src=gray, blockSize=2, ksize=5, k=0.07)
-        dest = cv2.dilate(dest, None)  # dilate corners for result, not important
-        self.frame[dest > 0.01 * dest.max()] = [0, 0, 255]
+        cv2.cornerHarris(src=gray, blockSize=2, ksize=5, k=0.07, dst=corners)
+        # Scale corners back to the frame size
+        height, width = self.gray.shape
+        dest = self.get_buffer('harris_dest', (height, width), np.float32)
+        cv2.resize(corners, (width, height), dst=dest, interpolation=cv2.INTER_NEAREST)
+        # Mask of corners as uint8 image. It is faster than NumPy boolean indexing
+        mask = cv2.compare(dest, 0.01 * float(dest.max()), cv2.CMP_GT)
+        color = self.get_buffer('harris', self.frame.shape, value=(0, 0, 255))  # image of corner color
+        # Paint corners on the frame. Pixels out of the mask are not changed
+        cv2.bitwise_or(color, color, dst=self.frame, mask=mask)
         return self.frame
 
+    def get_xfeatures(self, name, create):
+        """ Create feature detector or descriptor extractor only once and reuse it for next frames.
+            Return None if the algorithm is not available in this build of OpenCV """
+        if name not in self.xfeatures:
+            try:
+                self.xfeatures[name] = create()
+            except (cv2.error, AttributeError):  # patented algorithm or no contributions module
+                logging.info(f'Algorithm {name.upper()} is not available')
+                self.xfeatures[name] = None  # remember it, so do not try again on the next frame
+        return self.xfeatures[name]
+
     def get_features(self, xfeatures):
         """ Keypoints / features for SIFT, SURF and ORB filters """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        keypoints, descriptor = xfeatures.detectAndCompute(gray, None)
+        small = cv2.pyrDown(self.gray)  # detect features on the twice smaller gray frame
+        keypoints, descriptor = xfeatures.detectAndCompute(small, None)
+        for keypoint in keypoints:  # scale keypoints back to the frame size
+            keypoint.pt = (keypoint.pt[0] * 2, keypoint.pt[1] * 2)
+            keypoint.size *= 2
         return cv2.drawKeypoints(image=self.frame, outImage=self.frame, keypoints=keypoints,
                                  flags=cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS, color=(51, 163, 236))
 
     def filter_sift(self):
         """ Scale-Invariant Feature Transform (SIFT). It is patented and not totally free """
-        try:
-            return self.get_features(cv2.xfeatures2d.SIFT_create())
-        except cv2.error:
+        sift = self.get_xfeatures('sift', lambda: cv2.xfeatures2d.SIFT_create())
+        if sift is None:
             return self.frame  # return unchanged frame
+        return self.get_features(sift)
 
     def filter_surf(self):
         """ Speeded-Up Robust Features (SURF). It is patented and not totally free """
-        try:
-            return self.get_features(cv2.xfeatures2d.SURF_create(4000))
-        except cv2.error:
+        surf = self.get_xfeatures('surf', lambda: cv2.xfeatures2d.SURF_create(4000))
+        if surf is None:
             return self.frame  # return unchanged frame
+        return self.get_features(surf)
 
     def filter_orb(self):
         """ Oriented FAST and Rotated BRIEF (ORB). It is not patented and totally free """
-        return self.get_features(cv2.ORB_create())
+        return self.get_features(self.get_xfeatures('orb', cv2.ORB_create))
 
     def filter_brief(self):
         """ BRIEF descriptors with the help of CenSurE (STAR) detector """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        keypoints = cv2.xfeatures2d.StarDetector_create().detect(gray, None)
-        keypoints, descriptor = cv2.xfeatures2d.BriefDescriptorExtractor_create().compute(gray, keypoints)
+        gray = self.gray  # gray scale of the frame
+        star = self.get_xfeatures('star', lambda: cv2.xfeatures2d.StarDetector_create())
+        brief = self.get_xfeatures('brief', lambda: cv2.xfeatures2d.BriefDescriptorExtractor_create())
+        if star is None or brief is None:
+            return self.frame  # return unchanged frame
+        keypoints = star.detect(gray, None)
+        keypoints, descriptor = brief.compute(gray, keypoints)
         return cv2.drawKeypoints(image=self.frame, outImage=self.frame, keypoints=keypoints,
                                  flags=cv2.DRAW_MATCHES_FLAGS_DRAW_RICH_KEYPOINTS, color=(51, 163, 236))
 
+    @staticmethod
+    def get_means(planes, labels, num):
+        """ Look-up table of mean colors for every labeled region of the frame """
+        labels_1d = labels.ravel()
+        counts = np.maximum(np.bincount(labels_1d, minlength=num), 1)  # number of pixels in regions
+        means = np.empty((num, 3), np.uint8)
+        for channel, plane in enumerate(planes):
+            sums = np.bincount(labels_1d, weights=plane, minlength=num)
+            means[:, channel] = np.rint(sums / counts)  # mean color of the channel inside regions
+        return means
+
+    def get_regions(self, gray, planes, threshold):
+        """ Contours of the gray frame for the threshold and mean colors of regions inside them.
+            It runs in the pool of threads, so it only reads the current frame """
+        ret, thresh = cv2.threshold(gray, threshold, 255, 0)
+        # image, contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        # Label regions in one pass instead of filling a full size mask for every contour.
+        # Regions above the threshold are 8-connected, holes inside them are 4-connected
+        num, labels = cv2.connectedComponents(thresh, connectivity=8)  # label 0 is below the threshold
+        num_holes, holes = cv2.connectedComponents(cv2.bitwise_not(thresh), connectivity=4)
+        # Put regions and holes into one label image, so mean colors are found in one pass
+        np.add(holes, num - 1, out=holes, where=holes > 0)
+        labels += holes
+        num += num_holes - 1
+        fill = np.ones(num, bool)  # fill regions and holes enclosed by contours
+        border = np.concatenate((labels[[0, -1], :].ravel(), labels[:, [0, -1]].ravel()))
+        fill[border[border >= num - num_holes + 1]] = False  # holes on the frame border have no contour
+        colors = np.take(self.get_means(planes, labels, num), labels, axis=0)
+        return contours, np.take(fill, labels), colors
+
     def filter_contours(self):
         """ Draw contours with mean colors inside them """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to gray scale
-        frame = self.frame.copy()  # make a copy
-        for threshold in [15, 50, 100, 240]:  # use various thresholds
-            ret, thresh = cv2.threshold(gray, threshold, 255, 0)
-            # image, contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            contours, hierarchy = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            for contour in contours:
-                mask = np.zeros(gray.shape, np.uint8)  # create empty mask
-                cv2.drawContours(mask, [contour], 0, 255, -1)  # fill mask with white color
-                mean = cv2.mean(self.frame, mask=mask)  # find mean color inside mask
-                cv2.drawContours(frame, [contour], 0, mean, -1)  # draw frame with masked mean color
+        thresholds = [15, 50, 100, 240]  # use various thresholds
+        # Contiguous color planes of the frame as weights for mean colors. Build them once per frame
+        planes = np.ascontiguousarray(self.frame.reshape(-1, 3).T, dtype=np.float64)
+        # Find contours for all thresholds in parallel
+        n = len(thresholds)
+        results = self.pool.map(self.get_regions, [self.gray] * n, [planes] * n, thresholds)
+        frame = self.get_buffer('contours', self.frame.shape)
+        np.copyto(frame, self.frame)  # copy the frame into the reused output array
+        pixels = frame.view('V3')[:, :, 0]  # view RGB pixels as 3-byte items, so the mask is not broadcast
+        for contours, mask, colors in results:  # draw in order of thresholds
+            np.copyto(pixels, colors.view('V3')[:, :, 0], where=mask)  # fill regions and holes
             cv2.drawContours(frame, contours, -1, (0, 0, 0), 1)  # draw contours with black color
         return frame
 
@@ -185,7 +340,7 @@ class Filters:
         histogram_bins = 5
         num_iterations = 4
 
-        frame = cv2.cvtColor(self.frame, cv2.COLOR_RGB2HSV)
+        frame = self.hsv  # HSV of the frame
         height, width, channels = frame.shape
 
         seeds = cv2.ximgproc.createSuperpixelSEEDS(
@@ -225,17 +380,19 @@ class Filters:
         # return cv2.GaussianBlur(self.frame, (29, 29), 0)  # Gaussian blur
         # return cv2.medianBlur(self.frame, 29)  # Median blur
         # return cv2.bilateralFilter(self.frame, 11, 80, 80)  # Bilateral filter preserves the edges
-        return cv2.blur(self.frame, (29, 29))  # Blur classic
+        dst = self.get_output('blur', self.frame.shape)
+        return self.download(cv2.blur(self.umat(self.frame), (29, 29), dst=dst))  # Blur classic
 
     def filter_motion(self):
         """ Motion detection """
-        if self.previous is None or self.previous.shape != self.frame.shape:
-            self.previous = self.frame.copy()  # remember previous frame
+        gray = self.gray  # gray scale of the frame
+        if self.previous is None or self.previous.shape != gray.shape:
+            self.previous = gray  # remember previous gray frame
             return self.frame  # return unchanged frame
-        gray1 = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)  # convert to grayscale
-        gray2 = cv2.cvtColor(self.previous, cv2.COLOR_RGB2GRAY)
-        self.previous = self.frame.copy()  # remember previous frame
-        return cv2.absdiff(gray1, gray2)  # get absolute difference between two frames
+        # Get absolute difference between two frames
+        difference = cv2.absdiff(gray, self.previous, dst=self.get_buffer('motion', gray.shape))
+        self.previous = gray  # no copy, because gray frame is converted anew for every frame
+        return difference
 
     def filter_background(self):
         """ Background subtractor (KNN, MOG2, MOG or GMG) """
@@ -244,62 +401,75 @@ class Filters:
             self.background_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
             # self.background_subtractor = cv2.bgsegm.createBackgroundSubtractorGMG()
             # self.background_subtractor = cv2.bgsegm.createBackgroundSubtractorMOG()
-        fgmask = self.background_subtractor.apply(self.frame)
-        return self.frame & cv2.cvtColor(fgmask, cv2.COLOR_GRAY2RGB)
+        fgmask = self.download(self.background_subtractor.apply(self.umat(self.frame)))
+        # Display only the foreground pixels. Pixels out of the mask are not written, so clear them
+        frame = self.get_buffer('background', self.frame.shape)
+        frame.fill(0)
+        return cv2.bitwise_and(self.frame, self.frame, dst=frame, mask=fgmask)
 
     def filter_skin(self):
         """ Skin tones detection"""
-        # Determine upper and lower HSV limits for skin tones
-        lower = np.array([0, 100, 0], dtype='uint8')
-        upper = np.array([50, 255, 255], dtype='uint8')
-        # Switch to HSV
-        hsv = cv2.cvtColor(self.frame, cv2.COLOR_RGB2HSV)
+        shape = self.hsv.shape[:2]
         # Find mask of pixels within HSV range
-        skin_mask = cv2.inRange(hsv, lower, upper)
-        skin_mask = cv2.GaussianBlur(skin_mask, (9, 9), 0)  # noise suppression
-        # Kernel for morphology operation
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (4, 4))
-        # CLOSE (dilate / erode)
-        skin_mask = cv2.morphologyEx(skin_mask, cv2.MORPH_CLOSE, kernel, iterations=3)
-        skin_mask = cv2.GaussianBlur(skin_mask, (9, 9), 0)  # noise suppression
-        # Display only the masked pixels
-        return cv2.bitwise_and(self.frame, self.frame, mask=skin_mask)
+        skin_mask = cv2.inRange(self.umat(self.hsv), self.skin['lower'], self.skin['upper'],
+                                dst=self.get_output('skin_range', shape))
+        # CLOSE (dilate / erode) once with a large kernel instead of several iterations
+        skin_mask = cv2.morphologyEx(skin_mask, cv2.MORPH_CLOSE, self.skin['kernel'],
+                                     dst=self.get_output('skin_close', shape))
+        # Noise suppression. Larger 13x13 kernel (sigma 2.3) approximates the smoothing
+        # of the former blur, close, blur pipeline with two 9x9 blurs (sigma 1.7 * sqrt(2))
+        skin_mask = cv2.GaussianBlur(skin_mask, (13, 13), 0, dst=self.get_output('skin_mask', shape))
+        skin_mask = self.download(skin_mask)
+        # Display only the masked pixels. Pixels out of the mask are not written, so clear them
+        frame = self.get_buffer('skin', self.frame.shape)
+        frame.fill(0)
+        return cv2.bitwise_and(self.frame, self.frame, dst=frame, mask=skin_mask)
 
     def filter_optflow(self):
         """ Lucas Kanade optical flow """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
-        frame = self.frame.copy()  # copy the frame
+        gray = self.gray
+        opt_flow = self.opt_flow  # local name for the container, it is used many times per frame
         if self.previous is None or self.previous.shape != gray.shape:
-            self.previous = gray.copy()  # save previous gray frame
-            # Find new corner points of the frame
-            self.opt_flow['points'] = cv2.goodFeaturesToTrack(
+            self.previous = gray  # save previous gray frame, it is not changed by filters
+            # Find new corner points of the frame in background, so the video does not freeze
+            opt_flow['corners'] = self.pool.submit(
+                cv2.goodFeaturesToTrack,
                 gray, mask=None,
-                **self.opt_flow['feature_params'])
+                **opt_flow['feature_params'])
             # Create a new mask image for drawing purposes
-            self.opt_flow['mask'] = np.zeros_like(self.frame.copy())
+            opt_flow['mask'] = np.zeros_like(self.frame)
         #
         # If motion is large this method will fail. Ignore exceptions
         try:
+            if opt_flow['corners'] is not None:
+                if not opt_flow['corners'].done():
+                    return self.frame  # return unchanged frame till corner points are found
+                # Track corner points from the frame they were found on
+                opt_flow['points'] = opt_flow['corners'].result()
+                opt_flow['corners'] = None
             # Calculate optical flow. cv2.error could happen here.
             points, st, err = cv2.calcOpticalFlowPyrLK(
                 self.previous, gray,
-                self.opt_flow['points'], None, **self.opt_flow['lk_params'])
+                opt_flow['points'], None, **opt_flow['lk_params'])
             # Select good points
             good_new = points[st == 1]  # TypeError 'NoneType' could happen here
-            good_old = self.opt_flow['points'][st == 1]
+            good_old = opt_flow['points'][st == 1]
             # Draw the tracks
-            for i, (new, old) in enumerate(zip(good_new, good_old)):
-                a, b = new.ravel()
-                c, d = old.ravel()
-                # Draw lines in the mask
-                self.opt_flow['mask'] = cv2.line(self.opt_flow['mask'], (a, b), (c, d),
-                                                 self.opt_flow['color'][i].tolist(), 2)
-                # Draw circles in the frame
-                frame = cv2.circle(frame, (a, b), 5, self.opt_flow['color'][i].tolist(), -1)
+            height, width = gray.shape
+            lines, circles = get_tracks(good_new, good_old, width, height)
+            palette = len(opt_flow['colors'])
+            colors = opt_flow['colors'][:len(lines)]
+            for i, color in enumerate(colors):  # draw lines in the mask for every color of the palette
+                cv2.polylines(opt_flow['mask'], lines[i::palette], False, color, 2)
+            # Concatenate frame and mask images into the reused output array instead of a frame copy
+            frame = self.get_buffer('optflow', self.frame.shape)
+            cv2.add(self.frame, opt_flow['mask'], dst=frame)
+            for i, color in enumerate(colors):  # draw circles on top of the tracks
+                cv2.polylines(frame, circles[i::palette], False, color, 10)
             # Update the previous frame and previous points
-            self.previous = gray.copy()
-            self.opt_flow['points'] = good_new.reshape(-1, 1, 2)
-            return cv2.add(frame, self.opt_flow['mask'])  # concatenate frame and mask images
+            self.previous = gray  # gray frame is converted anew for every frame
+            opt_flow['points'] = good_new.reshape(-1, 1, 2)
+            return frame
         except (TypeError, cv2.error):
             self.previous = None  # set optical flow to None if exception occurred
             return self.frame  # return unchanged frame when error
@@ -361,8 +531,7 @@ class Filters:
 
     def filter_clahe(self):
         """ Contrast Limited Adaptive Histogram Equalization (CLAHE) """
-        # 'clipLimit' parameter is 40 by default; 'tileGridSize' parameter is 8x8 by default
-        clahe = cv2.createCLAHE(clipLimit=10., tileGridSize=(8, 8))
+        clahe = self.clahe['rgb']
         b, g, r = cv2.split(self.frame)  # split on blue, green and red channels
         b2 = clahe.apply(b)  # apply CLAHE to each channel
         g2 = clahe.apply(g)
@@ -373,8 +542,7 @@ class Filters:
         """ Increase the contrast using LAB color space and CLAHE """
         lab = cv2.cvtColor(self.frame, cv2.COLOR_RGB2LAB)  # convert image to LAB color model
         l, a, b = cv2.split(lab)  # split on l, a, b channels
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        l2 = clahe.apply(l)  # apply CLAHE to L-channel
+        l2 = self.clahe['lab'].apply(l)  # apply CLAHE to L-channel
         lab = cv2.merge((l2, a, b))  # merge enhanced L-channel with the a and b channels
         return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)  # convert back to RGB and return
 
@@ -394,27 +562,29 @@ class Filters:
 
     def filter_laplacian(self):
         """ Laplacian gradient filter """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
+        gray = self.gray
         # return cv2.Laplacian(gray, cv2.CV_8U)
         return np.uint8(np.absolute(cv2.Laplacian(gray, cv2.CV_64F)))
 
     def filter_sobel_x(self):
         """ Sobel / Scharr vertical gradient filter """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
+        gray = self.gray
         # return cv2.Sobel(gray, cv2.CV_8U, 1, 0, ksize=5)
         # return np.uint8(np.absolute(cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)))
         # return np.uint8(np.absolute(cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=-1)))
         # If ksize=-1, a 3x3 Scharr filter is used which gives better results than 3x3 Sobel filter
-        return cv2.Sobel(gray, cv2.CV_8U, 1, 0, ksize=-1)
+        dst = self.get_output('sobel', gray.shape)
+        return self.download(cv2.Sobel(self.umat(gray), cv2.CV_8U, 1, 0, dst=dst, ksize=-1))
 
     def filter_sobel_y(self):
         """ Sobel / Scharr horizontal gradient filter """
-        gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
+        gray = self.gray
         # return cv2.Sobel(gray, cv2.CV_8U, 0, 1, ksize=5)
         # return np.uint8(np.absolute(cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)))
         # reutnr np.uint8(np.absolute(cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=-1)))
         # If ksize=-1, a 3x3 Scharr filter is used which gives better results than 3x3 Sobel filter
-        return cv2.Sobel(gray, cv2.CV_8U, 0, 1, ksize=-1)
+        dst = self.get_output('sobel', gray.shape)
+        return self.download(cv2.Sobel(self.umat(gray), cv2.CV_8U, 0, 1, dst=dst, ksize=-1))
 
     def filter_blob(self):
         """ Blob detection """